@@ -1,16 +1,55 @@
 import gradio as gr
 import os
 import json
+import hashlib
+import sys
 import uuid
+import time
+import zlib
+import heapq
+import random
+import argparse
+import functools
+import threading
+import tracemalloc
 from datetime import datetime
+from types import SimpleNamespace
 from groq import Groq
 
-# Set up Groq API key
+# Rough characters-per-token ratio used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(messages):
+    """Estimate the prompt token count of a list of chat messages"""
+    return max(1, sum(len(message["content"]) for message in messages) // CHARS_PER_TOKEN)
+
+def make_stub_client(latency=0.5):
+    """Create an offline stand-in for the Groq client that sleeps for `latency` seconds per call"""
+    def create(messages, model, stream=False):
+        time.sleep(latency)
+        prompt = messages[-1]["content"]
+        content = f"Stub response to: {prompt.strip()[:80]}"
+        usage = SimpleNamespace(
+            prompt_tokens=estimate_tokens(messages),
+            completion_tokens=max(1, len(content) // CHARS_PER_TOKEN)
+        )
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+# Set up Groq API key (TEACHING_ASSISTANT_STUB=1 runs against a local stub instead)
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-if not GROQ_API_KEY:
+USE_STUB_CLIENT = os.environ.get("TEACHING_ASSISTANT_STUB") == "1"
+if not GROQ_API_KEY and not USE_STUB_CLIENT:
     raise ValueError("GROQ_API_KEY environment variable not set.")
 
-client = Groq(api_key=GROQ_API_KEY)
+client = make_stub_client() if USE_STUB_CLIENT else Groq(api_key=GROQ_API_KEY)
+LLM_MODEL = "llama-3.3-70b-versatile"
+
+# Record/replay settings: set TEACHING_ASSISTANT_RECORD to a .jsonl path to capture LLM exchanges
+RECORD_CASSETTE = os.environ.get("TEACHING_ASSISTANT_RECORD")
+REPLAY_RUNS_DIR = "replay_runs"
+CASSETTE_LOCK = threading.Lock()
 
 # Default system prompt
 SYSTEM_PROMPT = (
@@ -136,22 +175,401 @@ PROJECT_IDEAS = {
     ]
 }
 
-# User session data store
+# User session data store: session_id -> SessionRecord
 SESSION_DATA = {}
 
+# Profile fields collected during onboarding
+PROFILE_FIELDS = ['age', 'knowledge_level', 'goals', 'interests', 'study_time', 'learning_style']
+# Dropdown fields with few distinct values, interned so sessions share one string object
+INTERNED_PROFILE_FIELDS = ('knowledge_level', 'study_time', 'learning_style')
+
+# Catalog lookups so sessions can reference learning paths and resources by id
+PATH_IDS_BY_TITLE = {path['title']: path_id for path_id, path in LEARNING_PATHS.items()}
+RESOURCE_CATALOG = [resource for resources in LEARNING_RESOURCES.values() for resource in resources]
+RESOURCE_IDS_BY_URL = {resource['url']: index for index, resource in enumerate(RESOURCE_CATALOG)}
+
+# Chat messages longer than this many UTF-8 bytes are stored zlib-compressed
+CHAT_COMPRESSION_THRESHOLD = 256
+# Exchanges kept per session; only these are sent back to the LLM as conversation context
+CHAT_HISTORY_EXCHANGES = 3
+
+class SessionRecord:
+    """Compact per-session state; catalog entries are referenced by id rather than stored"""
+    __slots__ = (
+        'age', 'knowledge_level', 'goals', 'interests', 'study_time', 'learning_style',
+        'path_ids', 'resource_ids', 'projects', 'chat_history', 'last_activity'
+    )
+
+    def __init__(self):
+        for field in PROFILE_FIELDS:
+            setattr(self, field, None)
+        self.path_ids = ()
+        self.resource_ids = ()
+        self.projects = ()
+        # Flat list of packed messages: question, answer, question, answer, ...
+        self.chat_history = None
+        self.last_activity = 0.0
+
+def pack_chat_text(text):
+    """Compress chat text past the threshold, keeping it as a str when that doesn't save space"""
+    encoded = text.encode("utf-8")
+    if len(encoded) <= CHAT_COMPRESSION_THRESHOLD:
+        return text
+    compressed = zlib.compress(encoded)
+    return compressed if len(compressed) < len(encoded) else text
+
+def unpack_chat_text(packed):
+    """Restore chat text stored by pack_chat_text"""
+    if isinstance(packed, bytes):
+        return zlib.decompress(packed).decode("utf-8")
+    return packed
+
+def get_session_record(session_id):
+    """Return the session's record, creating an empty one if needed"""
+    record = SESSION_DATA.get(session_id)
+    if record is None:
+        record = SESSION_DATA[session_id] = SessionRecord()
+    return record
+
 def save_session(session_id, data):
     """Save session data to SESSION_DATA global dictionary"""
-    if session_id in SESSION_DATA:
-        SESSION_DATA[session_id].update(data)
-    else:
-        SESSION_DATA[session_id] = data
+    record = get_session_record(session_id)
+    for key, value in data.items():
+        if key == 'recommended_paths':
+            record.path_ids = tuple(PATH_IDS_BY_TITLE[path['title']] for path in value)
+        elif key == 'recommended_resources':
+            record.resource_ids = tuple(RESOURCE_IDS_BY_URL[resource['url']] for resource in value)
+        elif key == 'recommended_projects':
+            record.projects = tuple(value)
+        elif key in INTERNED_PROFILE_FIELDS and isinstance(value, str):
+            setattr(record, key, sys.intern(value))
+        elif key in PROFILE_FIELDS:
+            setattr(record, key, value)
     
     # Add timestamp for session tracking
-    SESSION_DATA[session_id]["last_activity"] = datetime.now().isoformat()
+    record.last_activity = time.time()
 
 def load_session(session_id):
-    """Load session data from SESSION_DATA global dictionary"""
-    return SESSION_DATA.get(session_id, {})
+    """Load session data from SESSION_DATA global dictionary.
+
+    Chat history is not included; use get_chat_history() for that.
+    """
+    record = SESSION_DATA.get(session_id)
+    if record is None:
+        return {}
+    
+    data = {field: getattr(record, field) for field in PROFILE_FIELDS if getattr(record, field) is not None}
+    data.update({
+        'recommended_paths': [LEARNING_PATHS[path_id] for path_id in record.path_ids],
+        'recommended_resources': [RESOURCE_CATALOG[index] for index in record.resource_ids],
+        'recommended_projects': list(record.projects),
+        'last_activity': datetime.fromtimestamp(record.last_activity).isoformat(),
+    })
+    return data
+
+def append_chat_exchange(session_id, question, answer):
+    """Add a question/answer pair to the session's chat history, keeping the last CHAT_HISTORY_EXCHANGES"""
+    record = get_session_record(session_id)
+    if record.chat_history is None:
+        record.chat_history = []
+    record.chat_history.append(pack_chat_text(question))
+    record.chat_history.append(pack_chat_text(answer))
+    del record.chat_history[:-2 * CHAT_HISTORY_EXCHANGES]
+    record.last_activity = time.time()
+
+def get_chat_history(session_id, limit=None):
+    """Return the session's chat history as (question, answer) pairs, optionally only the last `limit`"""
+    record = SESSION_DATA.get(session_id)
+    if record is None or not record.chat_history:
+        return []
+    
+    messages = record.chat_history if limit is None else record.chat_history[-2 * limit:]
+    texts = [unpack_chat_text(packed) for packed in messages]
+    return list(zip(texts[::2], texts[1::2]))
+
+# Admission control settings
+# Number of LLM calls allowed upstream at once; everything else waits in the fair queue
+UPSTREAM_CONCURRENCY = int(os.environ.get("UPSTREAM_CONCURRENCY", "4"))
+# Gradio worker threads; kept above UPSTREAM_CONCURRENCY so ordering is decided by our queue
+GRADIO_CONCURRENCY_LIMIT = 32
+
+# Per-session token buckets: burst size and refill rate (tokens per second).
+# Chat has its own allowance so a user's quizzes and study plans can't lock them out of chat.
+BUCKET_LIMITS = {
+    "chat": {"capacity": 5.0, "refill_rate": 0.2},
+    "bulk": {"capacity": 6.0, "refill_rate": 0.05},
+}
+# How often buckets that have refilled to capacity are evicted
+BUCKET_SWEEP_SECONDS = 60.0
+
+# Request classes: token bucket and cost, fair-queuing weight, wait SLO and initial service time estimate
+REQUEST_CLASSES = {
+    "chat": {"bucket": "chat", "cost": 1, "weight": 4, "slo_seconds": 15.0, "service_seconds": 3.0},
+    "quiz": {"bucket": "bulk", "cost": 2, "weight": 2, "slo_seconds": 45.0, "service_seconds": 6.0},
+    "study_plan": {"bucket": "bulk", "cost": 3, "weight": 1, "slo_seconds": 90.0, "service_seconds": 12.0},
+    # Speculative prefetches: free for the session, lowest weight and shed as soon as there is a backlog
+    "prefetch": {"bucket": None, "cost": 0, "weight": 0.5, "slo_seconds": 5.0, "service_seconds": 9.0},
+}
+
+# Interactive class whose wait SLO is protected under overload: every other class is shed once the
+# backlog would push the interactive wait past INTERACTIVE_HEADROOM of its SLO
+INTERACTIVE_CLASS = "chat"
+INTERACTIVE_HEADROOM = 0.5
+
+PROFILE_REQUIRED_MESSAGE = "Please complete your profile first by going to the Profile tab."
+RATE_LIMIT_MESSAGE = "⏳ You're sending requests faster than I can answer them."
+LOAD_SHED_MESSAGE = "⏳ The assistant is handling a lot of requests right now."
+
+# Prefetch settings: set TEACHING_ASSISTANT_PREFETCH=1 to generate likely next requests after onboarding
+PREFETCH_ENABLED = os.environ.get("TEACHING_ASSISTANT_PREFETCH") == "1"
+# Tokens all prefetches together may spend per budget window, and the amount reserved per prefetch up front
+PREFETCH_TOKEN_BUDGET = int(os.environ.get("PREFETCH_TOKEN_BUDGET", "200000"))
+PREFETCH_BUDGET_WINDOW_SECONDS = 3600.0
+PREFETCH_ESTIMATED_TOKENS = 1500
+# Unused prefetched responses expire after this long; at most this many sessions keep a prefetch cache
+PREFETCH_TTL_SECONDS = 600.0
+PREFETCH_MAX_SESSIONS = 1000
+# How long a request waits for a matching prefetch that already holds an upstream slot
+PREFETCH_WAIT_SECONDS = 30.0
+# How long a prefetch may wait in the queue for a slot before it is dropped
+PREFETCH_QUEUE_SECONDS = 10.0
+PREFETCH_CLASSES = ("quiz", "study_plan")
+
+# Quiz difficulty matching each onboarding knowledge level
+QUIZ_DIFFICULTY_BY_LEVEL = {
+    "Beginner": "Beginner",
+    "Intermediate": "Intermediate",
+    "Advanced": "Advanced",
+    "Expert": "Advanced",
+}
+
+# Prefetched responses per session, guarded by PREFETCH_LOCK
+PREFETCH_LOCK = threading.Lock()
+PREFETCH_CACHE = {}  # session_id -> cache, oldest first
+PREFETCH_BUDGET_WINDOW = {"started": time.monotonic(), "tokens": 0}
+PREFETCH_STATS = {
+    "generated": 0, "hits": 0, "misses": 0, "failed": 0, "cancelled": 0,
+    "skipped_budget": 0, "skipped_busy": 0, "tokens_spent": 0,
+}
+
+# Admission state, guarded by ADMISSION_LOCK
+ADMISSION_LOCK = threading.Condition()
+SESSION_BUCKETS = {}
+ADMISSION_STATE = {}
+ADMISSION_STATS = {}
+
+def reset_admission_state():
+    """Clear token buckets, the fair queue and admission counters"""
+    with ADMISSION_LOCK:
+        SESSION_BUCKETS.clear()
+        ADMISSION_STATE.clear()
+        ADMISSION_STATE.update({
+            "in_flight": {name: 0 for name in REQUEST_CLASSES},
+            "queue": [],  # heap of (finish_tag, sequence, request_class, ticket)
+            "flow_finish": {},  # (session_id, request_class) -> last finish tag
+            "virtual_time": 0.0,
+            "sequence": 0,
+            "last_bucket_sweep": time.monotonic(),
+            "service_seconds": {name: settings["service_seconds"] for name, settings in REQUEST_CLASSES.items()},
+        })
+        ADMISSION_STATS.clear()
+        ADMISSION_STATS.update({name: {"admitted": 0, "rate_limited": 0, "shed": 0} for name in REQUEST_CLASSES})
+
+reset_admission_state()
+
+def has_profile(session_id):
+    """Check whether the session has completed onboarding"""
+    record = SESSION_DATA.get(session_id)
+    return record is not None and bool(record.age)
+
+def format_retry_message(reason, retry_after):
+    """Format a rejection message with a retry hint"""
+    return f"{reason} Please try again in about {max(1, round(retry_after))} seconds."
+
+def refill_session_bucket(session_id, bucket_name, now):
+    """Top up one of a session's token buckets for the time elapsed since it was last used"""
+    limits = BUCKET_LIMITS[bucket_name]
+    bucket = SESSION_BUCKETS.setdefault((session_id, bucket_name), {"tokens": limits["capacity"], "updated": now})
+    elapsed = now - bucket["updated"]
+    bucket["tokens"] = min(limits["capacity"], bucket["tokens"] + elapsed * limits["refill_rate"])
+    bucket["updated"] = now
+    return bucket
+
+def evict_full_buckets(now):
+    """Drop buckets that have refilled to capacity; they are recreated full on next use"""
+    for key, bucket in list(SESSION_BUCKETS.items()):
+        limits = BUCKET_LIMITS[key[1]]
+        if bucket["tokens"] + (now - bucket["updated"]) * limits["refill_rate"] >= limits["capacity"]:
+            del SESSION_BUCKETS[key]
+    ADMISSION_STATE["last_bucket_sweep"] = now
+
+def estimate_queue_wait(finish_tag):
+    """Estimate seconds until a request with the given finish tag gets an upstream slot"""
+    in_flight = ADMISSION_STATE["in_flight"]
+    queue = ADMISSION_STATE["queue"]
+    service_seconds = ADMISSION_STATE["service_seconds"]
+    if sum(in_flight.values()) < UPSTREAM_CONCURRENCY and not queue:
+        return 0.0
+    
+    # Queued work that will be served first, plus in-flight calls assumed half done
+    work_ahead = sum(service_seconds[entry[2]] for entry in queue if entry[0] <= finish_tag)
+    work_ahead += sum(service_seconds[name] * count for name, count in in_flight.items()) / 2
+    return work_ahead / UPSTREAM_CONCURRENCY
+
+def estimate_backlog_wait(extra_seconds):
+    """Estimate the worst-case wait of a new request if `extra_seconds` of work joined the backlog"""
+    in_flight = ADMISSION_STATE["in_flight"]
+    queue = ADMISSION_STATE["queue"]
+    service_seconds = ADMISSION_STATE["service_seconds"]
+    # A slot would still be free for the next request
+    if sum(in_flight.values()) + len(queue) + 1 < UPSTREAM_CONCURRENCY:
+        return 0.0
+    
+    # Like in-flight calls, new work that starts immediately is assumed half done on average
+    starts_now = sum(in_flight.values()) < UPSTREAM_CONCURRENCY and not queue
+    work = sum(service_seconds[entry[2]] for entry in queue) + (extra_seconds / 2 if starts_now else extra_seconds)
+    work += sum(service_seconds[name] * count for name, count in in_flight.items()) / 2
+    return work / UPSTREAM_CONCURRENCY
+
+def new_ticket():
+    """Create an admission ticket, which a caller can keep to cancel a request still in the queue"""
+    return {"granted": False, "cancelled": False}
+
+def cancel_request(ticket):
+    """Withdraw a request that has not been given an upstream slot yet.
+
+    Returns False if the request already holds a slot and will run to completion.
+    """
+    state = ADMISSION_STATE
+    with ADMISSION_LOCK:
+        if ticket["granted"]:
+            return False
+        if not ticket["cancelled"]:
+            ticket["cancelled"] = True
+            state["queue"] = [entry for entry in state["queue"] if entry[3] is not ticket]
+            heapq.heapify(state["queue"])
+            ADMISSION_LOCK.notify_all()
+        return True
+
+def admit_request(session_id, request_class, ticket=None, max_wait=None):
+    """Rate-limit, shed or enqueue a request, blocking until it holds an upstream slot.
+
+    Returns None once the request may run, or a retry message if it was rejected, cancelled
+    through its ticket, or still queued after `max_wait` seconds.
+    """
+    settings = REQUEST_CLASSES[request_class]
+    state = ADMISSION_STATE
+    stats = ADMISSION_STATS[request_class]
+    ticket = ticket if ticket is not None else new_ticket()
+    with ADMISSION_LOCK:
+        now = time.monotonic()
+        if ticket["cancelled"]:
+            stats["shed"] += 1
+            return format_retry_message(LOAD_SHED_MESSAGE, 0)
+        
+        if now - state["last_bucket_sweep"] >= BUCKET_SWEEP_SECONDS:
+            evict_full_buckets(now)
+        
+        bucket = None
+        if settings["bucket"]:
+            bucket = refill_session_bucket(session_id, settings["bucket"], now)
+            if bucket["tokens"] < settings["cost"]:
+                stats["rate_limited"] += 1
+                refill_rate = BUCKET_LIMITS[settings["bucket"]]["refill_rate"]
+                retry_after = (settings["cost"] - bucket["tokens"]) / refill_rate
+                return format_retry_message(RATE_LIMIT_MESSAGE, retry_after)
+        
+        # Self-clocked fair queuing: each (session, request class) pair is its own flow,
+        # so a session flooding one class only pushes its own requests further back
+        flow = (session_id, request_class)
+        start_tag = max(state["virtual_time"], state["flow_finish"].get(flow, 0.0))
+        finish_tag = start_tag + state["service_seconds"][request_class] / settings["weight"]
+        
+        estimated_wait = estimate_queue_wait(finish_tag)
+        if estimated_wait > settings["slo_seconds"]:
+            stats["shed"] += 1
+            return format_retry_message(LOAD_SHED_MESSAGE, estimated_wait)
+        
+        # Lower-priority work is shed first, before it can build a backlog that interactive requests wait behind
+        if request_class != INTERACTIVE_CLASS:
+            interactive_wait = estimate_backlog_wait(state["service_seconds"][request_class])
+            if interactive_wait > REQUEST_CLASSES[INTERACTIVE_CLASS]["slo_seconds"] * INTERACTIVE_HEADROOM:
+                stats["shed"] += 1
+                return format_retry_message(LOAD_SHED_MESSAGE, interactive_wait)
+        
+        if bucket is not None:
+            bucket["tokens"] -= settings["cost"]
+        stats["admitted"] += 1
+        state["flow_finish"][flow] = finish_tag
+        
+        if sum(state["in_flight"].values()) < UPSTREAM_CONCURRENCY and not state["queue"]:
+            state["in_flight"][request_class] += 1
+            state["virtual_time"] = max(state["virtual_time"], start_tag)
+            ticket["granted"] = True
+            return None
+        
+        state["sequence"] += 1
+        heapq.heappush(state["queue"], (finish_tag, state["sequence"], request_class, ticket))
+        deadline = None if max_wait is None else now + max_wait
+        while not ticket["granted"] and not ticket["cancelled"]:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                ticket["cancelled"] = True
+                state["queue"] = [entry for entry in state["queue"] if entry[3] is not ticket]
+                heapq.heapify(state["queue"])
+                break
+            ADMISSION_LOCK.wait(remaining)
+        
+        if ticket["granted"]:
+            return None
+        stats["shed"] += 1
+        return format_retry_message(LOAD_SHED_MESSAGE, estimate_queue_wait(finish_tag))
+
+def release_request(request_class, elapsed):
+    """Free an upstream slot, update the service time estimate and dispatch waiting requests"""
+    state = ADMISSION_STATE
+    with ADMISSION_LOCK:
+        state["in_flight"][request_class] -= 1
+        previous = state["service_seconds"][request_class]
+        state["service_seconds"][request_class] = 0.8 * previous + 0.2 * elapsed
+        
+        while state["queue"] and sum(state["in_flight"].values()) < UPSTREAM_CONCURRENCY:
+            finish_tag, _, queued_class, ticket = heapq.heappop(state["queue"])
+            state["virtual_time"] = max(state["virtual_time"], finish_tag)
+            state["in_flight"][queued_class] += 1
+            ticket["granted"] = True
+        
+        # Finish tags at or below the virtual time no longer affect scheduling
+        if not state["queue"]:
+            state["flow_finish"] = {
+                flow: tag for flow, tag in state["flow_finish"].items() if tag > state["virtual_time"]
+            }
+        ADMISSION_LOCK.notify_all()
+
+def admission_controlled(request_class):
+    """Decorator placing a Gradio handler behind the profile check, session rate limiter and fair queue"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(session_id, *args):
+            # Checked before admission so profile reminders cost no tokens or queue slots
+            if not has_profile(session_id):
+                return PROFILE_REQUIRED_MESSAGE
+            
+            prefetched = take_prefetched(session_id, request_class, args)
+            if prefetched is not None:
+                return prefetched
+            
+            rejection = admit_request(session_id, request_class)
+            if rejection:
+                return rejection
+            
+            started = time.monotonic()
+            try:
+                return handler(session_id, *args)
+            finally:
+                release_request(request_class, time.monotonic() - started)
+        return wrapper
+    return decorator
 
 def recommend_learning_path(age, goals, knowledge_level, interests):
     """Recommend personalized learning paths based on user profile"""
@@ -214,8 +632,8 @@ def get_project_ideas(learning_paths):
     
     return ideas[:5]  # Return up to 5 project ideas
 
-def generate_quiz(topic, difficulty):
-    """Generate a quiz based on the topic and difficulty"""
+def build_quiz_messages(topic, difficulty):
+    """Build the LLM messages for a quiz request"""
     # In a real application, you might use the LLM to generate quizzes
     # Here we're using a template approach for simplicity
     quiz_prompt = f"""
@@ -224,22 +642,13 @@ def generate_quiz(topic, difficulty):
     Format the quiz nicely with clear question numbering and option lettering.
     """
     
-    # Use Groq to generate the quiz
-    quiz_messages = [
+    return [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": quiz_prompt}
     ]
-    
-    quiz_response = client.chat.completions.create(
-        messages=quiz_messages,
-        model="llama-3.3-70b-versatile",
-        stream=False
-    )
-    
-    return quiz_response.choices[0].message.content
 
-def create_study_plan(topic, time_available, goals):
-    """Create a personalized study plan"""
+def build_study_plan_messages(topic, time_available, goals):
+    """Build the LLM messages for a study plan request"""
     plan_prompt = f"""
     Create a structured study plan for learning {topic} with {time_available} hours per week available for study.
     The learner's goal is: {goals}
@@ -252,68 +661,143 @@ def create_study_plan(topic, time_available, goals):
     5. Tips for effective learning
     """
     
-    # Use Groq to generate the study plan
-    plan_messages = [
+    return [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": plan_prompt}
     ]
-    
-    plan_response = client.chat.completions.create(
-        messages=plan_messages,
-        model="llama-3.3-70b-versatile",
-        stream=False
-    )
-    
-    return plan_response.choices[0].message.content
 
-def chat_with_groq(user_input, session_id):
-    """Chat with Groq LLM using session context"""
-    user_data = load_session(session_id)
-    
+def build_chat_messages(user_input, profile, history):
+    """Build the LLM messages for a chat turn from the user profile and recent exchanges"""
     # Build context from session data if available
     context = ""
-    if user_data:
+    if profile:
         context = f"""
         User Profile:
-        - Age: {user_data.get('age', 'Unknown')}
-        - Knowledge Level: {user_data.get('knowledge_level', 'Unknown')}
-        - Learning Goals: {user_data.get('goals', 'Unknown')}
-        - Interests: {user_data.get('interests', 'Unknown')}
-        - Available Study Time: {user_data.get('study_time', 'Unknown')} hours per week
-        - Preferred Learning Style: {user_data.get('learning_style', 'Unknown')}
+        - Age: {profile.get('age', 'Unknown')}
+        - Knowledge Level: {profile.get('knowledge_level', 'Unknown')}
+        - Learning Goals: {profile.get('goals', 'Unknown')}
+        - Interests: {profile.get('interests', 'Unknown')}
+        - Available Study Time: {profile.get('study_time', 'Unknown')} hours per week
+        - Preferred Learning Style: {profile.get('learning_style', 'Unknown')}
         
         Based on this profile, tailor your response appropriately.
         """
     
     # Add chat history context if available
-    chat_history = user_data.get('chat_history', [])
-    if chat_history:
+    if history:
         context += "\n\nRecent conversation context (most recent first):\n"
-        # Include up to 3 most recent exchanges
-        for i, (q, a) in enumerate(reversed(chat_history[-3:])):
+        for q, a in reversed(history):
             context += f"User: {q}\nYou: {a}\n\n"
     
     # Combine everything for the LLM
     full_prompt = f"{context}\n\nUser's current question: {user_input}"
     
-    messages = [
+    return [
         {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": full_prompt}
     ]
-    
-    chat_completion = client.chat.completions.create(
+
+# Prompt builders by handler name, shared by live calls and cassette replay
+PROMPT_BUILDERS = {
+    "chat": build_chat_messages,
+    "quiz": build_quiz_messages,
+    "study_plan": build_study_plan_messages,
+}
+
+def record_exchange(cassette_path, exchange):
+    """Append one recorded LLM exchange to a cassette file"""
+    with CASSETTE_LOCK:
+        directory = os.path.dirname(cassette_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(cassette_path, "a", encoding="utf-8") as cassette:
+            cassette.write(json.dumps(exchange) + "\n")
+
+def load_cassette(cassette_path):
+    """Load recorded LLM exchanges from a cassette file"""
+    with open(cassette_path, encoding="utf-8") as cassette:
+        return [json.loads(line) for line in cassette if line.strip()]
+
+def make_replay_client(exchanges):
+    """Create a stub client that answers with recorded responses, in recording order.
+
+    Prompt tokens are rescaled from the recorded usage by the change in prompt length,
+    so edits to prompt construction show up as token growth without calling the API.
+    """
+    remaining = iter(exchanges)
+
+    def create(messages, model, stream=False):
+        exchange = next(remaining)
+        prompt_chars = sum(len(message["content"]) for message in messages)
+        recorded_tokens = exchange["usage"].get("prompt_tokens")
+        if recorded_tokens and exchange.get("prompt_chars"):
+            prompt_tokens = round(recorded_tokens * prompt_chars / exchange["prompt_chars"])
+        else:
+            prompt_tokens = estimate_tokens(messages)
+        completion_tokens = exchange["usage"].get("completion_tokens")
+        if completion_tokens is None:
+            completion_tokens = max(1, len(exchange["response"]) // CHARS_PER_TOKEN)
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        message = SimpleNamespace(content=exchange["response"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+def call_llm(handler, inputs, messages):
+    """Send messages to the LLM, recording the exchange when a cassette is configured"""
+    started = time.monotonic()
+    completion = client.chat.completions.create(
         messages=messages,
-        model="llama-3.3-70b-versatile",
+        model=LLM_MODEL,
         stream=False
     )
     
+    if RECORD_CASSETTE:
+        usage = getattr(completion, "usage", None)
+        record_exchange(RECORD_CASSETTE, {
+            "handler": handler,
+            "inputs": inputs,
+            "prompt_chars": sum(len(message["content"]) for message in messages),
+            "response": completion.choices[0].message.content,
+            "usage": {
+                "prompt_tokens": getattr(usage, "prompt_tokens", None),
+                "completion_tokens": getattr(usage, "completion_tokens", None),
+            },
+            "latency": time.monotonic() - started,
+            "recorded_at": datetime.now().isoformat(),
+        })
+    
+    return completion
+
+def generate_quiz(topic, difficulty):
+    """Generate a quiz based on the topic and difficulty"""
+    inputs = {"topic": topic, "difficulty": difficulty}
+    quiz_response = call_llm("quiz", inputs, build_quiz_messages(**inputs))
+    return quiz_response.choices[0].message.content
+
+def create_study_plan(topic, time_available, goals):
+    """Create a personalized study plan"""
+    inputs = {"topic": topic, "time_available": time_available, "goals": goals}
+    plan_response = call_llm("study_plan", inputs, build_study_plan_messages(**inputs))
+    return plan_response.choices[0].message.content
+
+def chat_with_groq(user_input, session_id):
+    """Chat with Groq LLM using session context"""
+    user_data = load_session(session_id)
+    
+    profile = {}
+    if user_data:
+        profile = {key: user_data.get(key, 'Unknown') for key in PROFILE_FIELDS}
+    # Include the most recent exchanges
+    history = [list(exchange) for exchange in get_chat_history(session_id, limit=CHAT_HISTORY_EXCHANGES)]
+    
+    inputs = {"user_input": user_input, "profile": profile, "history": history}
+    chat_completion = call_llm("chat", inputs, build_chat_messages(**inputs))
+    
     response = chat_completion.choices[0].message.content
     
     # Update chat history
-    if 'chat_history' not in user_data:
-        user_data['chat_history'] = []
-    user_data['chat_history'].append((user_input, response))
-    save_session(session_id, user_data)
+    append_chat_exchange(session_id, user_input, response)
     
     return response
 
@@ -410,15 +894,14 @@ def user_onboarding(session_id, age, goals, knowledge_level, interests, study_ti
     I'm here to help you every step of the way! What would you like to explore first?
     """
     
+    if PREFETCH_ENABLED:
+        start_prefetch(session_id, user_data, learning_paths)
+    
     return welcome_message
 
+@admission_controlled("chat")
 def chatbot_interface(session_id, user_message):
     """Main chatbot interface function"""
-    user_data = load_session(session_id)
-    
-    if not user_data or not user_data.get('age'):
-        return "Please complete your profile first by going to the Profile tab."
-    
     response = chat_with_groq(user_message, session_id)
     return response
 
@@ -427,7 +910,7 @@ def generate_recommendations(session_id):
     user_data = load_session(session_id)
     
     if not user_data or not user_data.get('age'):
-        return "Please complete your profile first by going to the Profile tab."
+        return PROFILE_REQUIRED_MESSAGE
     
     # Generate fresh recommendations
     learning_paths = recommend_learning_path(
@@ -460,31 +943,571 @@ def generate_recommendations(session_id):
     
     return recommendations
 
+@admission_controlled("quiz")
 def handle_quiz_request(session_id, topic, difficulty):
     """Handle quiz generation request"""
-    user_data = load_session(session_id)
-    
-    if not user_data or not user_data.get('age'):
-        return "Please complete your profile first by going to the Profile tab."
-    
     quiz = generate_quiz(topic, difficulty)
     return quiz
 
+@admission_controlled("study_plan")
 def handle_study_plan_request(session_id, topic, time_available):
     """Handle study plan generation request"""
     user_data = load_session(session_id)
-    
-    if not user_data or not user_data.get('age'):
-        return "Please complete your profile first by going to the Profile tab."
-    
     goals = user_data.get('goals', 'improving skills')
     study_plan = create_study_plan(topic, time_available, goals)
     return study_plan
 
+def predict_next_requests(profile, learning_paths):
+    """Predict the quiz and study plan a learner is likely to request right after onboarding.
+
+    Returns (request_class, handler_args, builder_inputs) tuples, where handler_args match
+    what the Practice and Study Plan tabs pass to their handlers.
+    """
+    if not learning_paths:
+        return []
+    
+    top_path = learning_paths[0]
+    difficulty = QUIZ_DIFFICULTY_BY_LEVEL.get(profile.get('knowledge_level'), "Beginner")
+    first_module = top_path['modules'][0]
+    study_time = profile.get('study_time')
+    goals = profile.get('goals', 'improving skills')
+    return [
+        ("quiz", (first_module, difficulty), {"topic": first_module, "difficulty": difficulty}),
+        ("study_plan", (top_path['title'], study_time),
+         {"topic": top_path['title'], "time_available": study_time, "goals": goals}),
+    ]
+
+def prefetch_key(request_class, args):
+    """Cache key for a handler request, ignoring case and surrounding whitespace"""
+    return (request_class,) + tuple(str(arg).strip().lower() for arg in args)
+
+def evict_prefetch_caches(now):
+    """Drop expired session caches, and the oldest ones beyond PREFETCH_MAX_SESSIONS (lock held)"""
+    for session_id, cache in list(PREFETCH_CACHE.items()):
+        expired = now - cache["created"] > PREFETCH_TTL_SECONDS
+        if not expired and len(PREFETCH_CACHE) <= PREFETCH_MAX_SESSIONS:
+            break
+        del PREFETCH_CACHE[session_id]
+
+def charge_prefetch_budget(tokens, now):
+    """Add (or refund) prefetch tokens to the current budget window and the lifetime total (lock held)"""
+    if now - PREFETCH_BUDGET_WINDOW["started"] >= PREFETCH_BUDGET_WINDOW_SECONDS:
+        PREFETCH_BUDGET_WINDOW.update(started=now, tokens=0)
+    PREFETCH_BUDGET_WINDOW["tokens"] = max(0, PREFETCH_BUDGET_WINDOW["tokens"] + tokens)
+    PREFETCH_STATS["tokens_spent"] += tokens
+
+def take_prefetched(session_id, request_class, args):
+    """Pop a prefetched response for this request, or return None on a miss.
+
+    If the prefetch for this request already holds an upstream slot, wait up to PREFETCH_WAIT_SECONDS
+    for it rather than making a second LLM call. A prefetch still queued is cancelled instead, so
+    the real request never waits behind speculative work.
+    """
+    if not PREFETCH_ENABLED or request_class not in PREFETCH_CLASSES:
+        return None
+    
+    key = prefetch_key(request_class, args)
+    with PREFETCH_LOCK:
+        evict_prefetch_caches(time.monotonic())
+        cache = PREFETCH_CACHE.get(session_id)
+        if cache is None:
+            return None
+        pending = cache["pending"].get(key)
+    
+    if pending is not None:
+        pending["claimed"] = True
+        if not cancel_request(pending["ticket"]):
+            pending["done"].wait(PREFETCH_WAIT_SECONDS)
+    
+    with PREFETCH_LOCK:
+        response = cache["responses"].pop(key, None)
+        PREFETCH_STATS["hits" if response is not None else "misses"] += 1
+        # Nothing left to serve: free the session's cache now rather than at expiry
+        if not cache["responses"] and not cache["pending"] and PREFETCH_CACHE.get(session_id) is cache:
+            del PREFETCH_CACHE[session_id]
+        return response
+
+def prefetch_response(session_id, cache, request_class, args, inputs, pending):
+    """Generate one predicted response into the cache, within the global spend budget"""
+    with PREFETCH_LOCK:
+        charge_prefetch_budget(0, time.monotonic())
+        if PREFETCH_BUDGET_WINDOW["tokens"] + PREFETCH_ESTIMATED_TOKENS > PREFETCH_TOKEN_BUDGET:
+            PREFETCH_STATS["skipped_budget"] += 1
+            return
+        charge_prefetch_budget(PREFETCH_ESTIMATED_TOKENS, time.monotonic())
+    
+    if admit_request(session_id, "prefetch", ticket=pending["ticket"], max_wait=PREFETCH_QUEUE_SECONDS):
+        with PREFETCH_LOCK:
+            # Either cancelled by the real request for this prediction, or shed / not dispatched in time
+            PREFETCH_STATS["cancelled" if pending.get("claimed") else "skipped_busy"] += 1
+            charge_prefetch_budget(-PREFETCH_ESTIMATED_TOKENS, time.monotonic())
+        return
+    
+    started = time.monotonic()
+    try:
+        completion = call_llm(request_class, inputs, PROMPT_BUILDERS[request_class](**inputs))
+    except Exception:
+        # Prefetching is best effort; upstream errors must not affect the remaining predictions
+        with PREFETCH_LOCK:
+            PREFETCH_STATS["failed"] += 1
+            charge_prefetch_budget(-PREFETCH_ESTIMATED_TOKENS, time.monotonic())
+        return
+    finally:
+        release_request("prefetch", time.monotonic() - started)
+    
+    usage = getattr(completion, "usage", None)
+    tokens = (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0)
+    with PREFETCH_LOCK:
+        charge_prefetch_budget((tokens or PREFETCH_ESTIMATED_TOKENS) - PREFETCH_ESTIMATED_TOKENS, time.monotonic())
+        PREFETCH_STATS["generated"] += 1
+        cache["responses"][prefetch_key(request_class, args)] = completion.choices[0].message.content
+
+def run_prefetch(session_id, cache, predictions):
+    """Generate predicted responses at low priority into a session's prefetch cache"""
+    for request_class, args, inputs in predictions:
+        key = prefetch_key(request_class, args)
+        try:
+            prefetch_response(session_id, cache, request_class, args, inputs, cache["pending"][key])
+        finally:
+            # Wake any handler waiting on this prediction, whatever the outcome
+            with PREFETCH_LOCK:
+                cache["pending"].pop(key)["done"].set()
+
+def start_prefetch(session_id, profile, learning_paths):
+    """Start prefetching a session's likely next requests in the background"""
+    predictions = predict_next_requests(profile, learning_paths)
+    # A fresh cache per onboarding; prefetches still running for an older profile write to the old one.
+    # Every prediction is pending until its prefetch finishes, succeeds or not; its admission
+    # ticket lets a real request cancel it while it is still queued.
+    cache = {
+        "created": time.monotonic(),
+        "responses": {},
+        "pending": {
+            prefetch_key(request_class, args): {"done": threading.Event(), "ticket": new_ticket()}
+            for request_class, args, _ in predictions
+        },
+    }
+    with PREFETCH_LOCK:
+        # Re-insert so PREFETCH_CACHE stays ordered oldest first
+        PREFETCH_CACHE.pop(session_id, None)
+        PREFETCH_CACHE[session_id] = cache
+        evict_prefetch_caches(cache["created"])
+    threading.Thread(target=run_prefetch, args=(session_id, cache, predictions), daemon=True).start()
+
+def suggest_next_inputs(session_id):
+    """Pre-fill the quiz and study plan inputs with the requests that were prefetched"""
+    user_data = load_session(session_id)
+    predictions = predict_next_requests(user_data, user_data.get('recommended_paths', []))
+    if not predictions:
+        return gr.update(), gr.update(), gr.update(), gr.update()
+    
+    (_, (quiz_topic, difficulty), _), (_, (plan_topic, study_time), _) = predictions
+    return quiz_topic, difficulty, plan_topic, study_time
+
+def format_prefetch_report():
+    """Format prefetch hit-rate and spend metrics"""
+    with PREFETCH_LOCK:
+        stats = dict(PREFETCH_STATS)
+        window_tokens = PREFETCH_BUDGET_WINDOW["tokens"]
+        cached_sessions = len(PREFETCH_CACHE)
+    
+    used = stats["hits"] / stats["generated"] if stats["generated"] else 0.0
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / lookups if lookups else 0.0
+    result = "### Prefetch Report\n\n"
+    result += f"- **Enabled:** {PREFETCH_ENABLED}\n"
+    result += f"- **Prefetched responses:** {stats['generated']}\n"
+    result += f"- **Hits / misses:** {stats['hits']} / {stats['misses']} (hit rate {hit_rate:.0%})\n"
+    result += f"- **Prefetched responses used:** {used:.0%}\n"
+    result += f"- **Skipped (budget / busy):** {stats['skipped_budget']} / {stats['skipped_busy']}\n"
+    result += f"- **Failed / cancelled by a real request:** {stats['failed']} / {stats['cancelled']}\n"
+    result += f"- **Tokens spent this window:** {window_tokens} of {PREFETCH_TOKEN_BUDGET} per {PREFETCH_BUDGET_WINDOW_SECONDS / 60:.0f} minutes\n"
+    result += f"- **Tokens spent in total:** {stats['tokens_spent']}\n"
+    result += f"- **Sessions with cached prefetches:** {cached_sessions} (max {PREFETCH_MAX_SESSIONS})\n"
+    return result
+
+def session_footprint(session_id, record):
+    """Approximate bytes held by one SessionRecord, excluding shared catalog and interned objects"""
+    size = sys.getsizeof(session_id) + sys.getsizeof(record) + sys.getsizeof(record.last_activity)
+    for field in PROFILE_FIELDS:
+        value = getattr(record, field)
+        if value is not None and field not in INTERNED_PROFILE_FIELDS:
+            size += sys.getsizeof(value)
+    # Tuples hold references to catalog ids and project titles, which are shared
+    size += sys.getsizeof(record.path_ids) + sys.getsizeof(record.resource_ids) + sys.getsizeof(record.projects)
+    if record.chat_history is not None:
+        size += sys.getsizeof(record.chat_history) + sum(sys.getsizeof(packed) for packed in record.chat_history)
+    return size
+
+def admission_footprints():
+    """Approximate bytes of token buckets and fair-queue flow tags held per session"""
+    sizes = {}
+    with ADMISSION_LOCK:
+        for key, bucket in SESSION_BUCKETS.items():
+            size = sys.getsizeof(key) + sys.getsizeof(bucket) + sum(sys.getsizeof(value) for value in bucket.values())
+            sizes[key[0]] = sizes.get(key[0], 0) + size
+        for key, tag in ADMISSION_STATE["flow_finish"].items():
+            sizes[key[0]] = sizes.get(key[0], 0) + sys.getsizeof(key) + sys.getsizeof(tag)
+    return sizes
+
+def prefetch_footprints():
+    """Approximate bytes of cached prefetch responses and pending entries held per session"""
+    sizes = {}
+    with PREFETCH_LOCK:
+        for session_id, cache in PREFETCH_CACHE.items():
+            size = sys.getsizeof(cache) + sys.getsizeof(cache["responses"]) + sys.getsizeof(cache["pending"])
+            size += sum(sys.getsizeof(key) + sys.getsizeof(response) for key, response in cache["responses"].items())
+            size += sum(sys.getsizeof(key) + sys.getsizeof(pending) for key, pending in cache["pending"].items())
+            sizes[session_id] = size
+    return sizes
+
+def format_memory_report(top=10):
+    """Format per-session and total memory footprint of all per-session state.
+
+    Covers SESSION_DATA records, admission state (token buckets and flow tags) and prefetch caches.
+    """
+    records = {sid: session_footprint(sid, record) for sid, record in list(SESSION_DATA.items())}
+    admission = admission_footprints()
+    prefetch = prefetch_footprints()
+    footprints = sorted(
+        ((records.get(sid, 0) + admission.get(sid, 0) + prefetch.get(sid, 0), sid)
+         for sid in set(records) | set(admission) | set(prefetch)),
+        reverse=True
+    )
+    containers = (
+        sys.getsizeof(SESSION_DATA) + sys.getsizeof(SESSION_BUCKETS)
+        + sys.getsizeof(ADMISSION_STATE["flow_finish"]) + sys.getsizeof(PREFETCH_CACHE)
+    )
+    total = sum(size for size, _ in footprints) + containers
+    
+    result = "### Session Memory Report\n\n"
+    result += f"- **Sessions:** {len(footprints)}\n"
+    result += f"- **Total:** {total / 1024:.1f} KiB\n"
+    result += f"- **Session records:** {sum(records.values()) / 1024:.1f} KiB\n"
+    result += f"- **Token buckets and flow tags:** {sum(admission.values()) / 1024:.1f} KiB\n"
+    result += f"- **Prefetch caches:** {sum(prefetch.values()) / 1024:.1f} KiB\n"
+    if footprints:
+        result += f"- **Average per session:** {total / len(footprints):.0f} bytes\n"
+        result += f"\n**Largest {min(top, len(footprints))} sessions:**\n\n"
+        result += "| Rank | Session hash | Bytes | Record | Admission | Prefetch | Chat messages |\n"
+        result += "|---|---|---|---|---|---|---|\n"
+        for rank, (size, sid) in enumerate(footprints[:top], 1):
+            record = SESSION_DATA.get(sid)
+            messages = len(record.chat_history or []) if record else 0
+            # Session ids are the only handle on a user's state, so never expose them
+            session_hash = hashlib.sha256(sid.encode("utf-8")).hexdigest()[:8]
+            result += (
+                f"| {rank} | {session_hash} | {size} | {records.get(sid, 0)} | {admission.get(sid, 0)} | "
+                f"{prefetch.get(sid, 0)} | {messages} |\n"
+            )
+    return result
+
+def benchmark_session_memory(num_sessions=100000, max_exchanges=3, seed=0, corpus_path=None):
+    """Measure bytes per session for synthetic sessions stored as plain dicts and as SessionRecords.
+
+    The dict layout mirrors what sessions held before SessionRecord: profile strings, per-session
+    recommendation lists, (question, answer) tuples and an ISO timestamp string. Chat text is cut
+    from real prose (the readme by default) so compression ratios are realistic.
+    """
+    corpus_path = corpus_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "readme.md")
+    with open(corpus_path, encoding="utf-8") as corpus_file:
+        corpus = " ".join(corpus_file.read().split())
+    
+    def excerpt(rng, min_chars, max_chars):
+        length = min(len(corpus), rng.randint(min_chars, max_chars))
+        offset = rng.randint(0, len(corpus) - length)
+        return corpus[offset:offset + length]
+    
+    interests = ["python programming", "data analysis", "machine learning", "deep learning and ai", "coding and statistics"]
+
+    def synthetic_sessions(rng):
+        for index in range(num_sessions):
+            # Fresh string objects for every session, as Gradio would deliver them
+            profile = {
+                'age': str(rng.randint(12, 70)),
+                'goals': excerpt(rng, 30, 100),
+                'knowledge_level': rng.choice(["Beginner", "Intermediate", "Advanced", "Expert"]).encode().decode(),
+                'interests': rng.choice(interests).encode().decode(),
+                'study_time': rng.choice(["1-3", "4-6", "7-10", "10+"]).encode().decode(),
+                'learning_style': rng.choice(["Visual", "Hands-on Projects", "Combination"]).encode().decode(),
+            }
+            exchanges = [
+                (excerpt(rng, 30, 150), excerpt(rng, 500, 1500))
+                for _ in range(rng.randint(0, max_exchanges))
+            ]
+            yield f"bench-{index}", profile, exchanges
+
+    def measure(store_session):
+        store = {}
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        for session_id, profile, exchanges in synthetic_sessions(random.Random(seed)):
+            store_session(store, session_id, profile, exchanges)
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        return used
+
+    def store_dict(store, session_id, profile, exchanges):
+        paths = recommend_learning_path(profile['age'], profile['goals'], profile['knowledge_level'], profile['interests'])
+        data = dict(profile)
+        data.update({
+            'recommended_paths': paths,
+            'recommended_resources': get_recommended_resources(profile['interests']),
+            'recommended_projects': get_project_ideas(paths),
+            'last_activity': datetime.now().isoformat(),
+        })
+        if exchanges:
+            data['chat_history'] = exchanges
+        store[session_id] = data
+
+    def store_record(store, session_id, profile, exchanges):
+        paths = recommend_learning_path(profile['age'], profile['goals'], profile['knowledge_level'], profile['interests'])
+        save_session(session_id, profile)
+        save_session(session_id, {
+            'recommended_paths': paths,
+            'recommended_resources': get_recommended_resources(profile['interests']),
+            'recommended_projects': get_project_ideas(paths),
+        })
+        for question, answer in exchanges:
+            append_chat_exchange(session_id, question, answer)
+        store[session_id] = SESSION_DATA.pop(session_id)
+
+    dict_bytes = measure(store_dict)
+    record_bytes = measure(store_record)
+    
+    result = f"### Session Memory Benchmark ({num_sessions} synthetic sessions, up to {max_exchanges} chat exchanges each)\n\n"
+    result += f"Chat text sampled from {os.path.basename(corpus_path)}.\n\n"
+    result += "| Representation | Total (MiB) | Bytes per session |\n|---|---|---|\n"
+    for name, used in [("dict", dict_bytes), ("SessionRecord", record_bytes)]:
+        result += f"| {name} | {used / 2 ** 20:.1f} | {used / num_sessions:.0f} |\n"
+    result += f"\nSessionRecord uses {(1 - record_bytes / dict_bytes):.0%} less memory.\n"
+    return result
+
+def percentile(values, fraction):
+    """Return the value at the given fraction of a sorted copy of `values`"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def simulate_load(num_users=16, requests_per_user=6, upstream_latency=0.1, time_scale=0.05,
+                  upstream_slots=1, think_seconds=40.0, include_flooder=True):
+    """Drive the admission-controlled handlers with simulated users against a local stub.
+
+    User 0 floods "Generate Study Plan" (or stays idle without `include_flooder`); the rest mix
+    chat, quizzes and study plans with random think time. The defaults offer more work than
+    `upstream_slots` can serve, so the fair queue and load shedding, not the token buckets,
+    are the limiting constraint. SLOs, bucket refill and think time are scaled by `time_scale`
+    so the run finishes in seconds.
+
+    Returns the run settings and (user_index, request_class, outcome, latency, response) results.
+    """
+    global client, UPSTREAM_CONCURRENCY
+    saved = (
+        client,
+        UPSTREAM_CONCURRENCY,
+        {name: dict(limits) for name, limits in BUCKET_LIMITS.items()},
+        {name: dict(settings) for name, settings in REQUEST_CLASSES.items()},
+    )
+    client = make_stub_client(upstream_latency)
+    UPSTREAM_CONCURRENCY = upstream_slots
+    for limits in BUCKET_LIMITS.values():
+        limits["refill_rate"] /= time_scale
+    for settings in REQUEST_CLASSES.values():
+        settings["slo_seconds"] *= time_scale
+        settings["service_seconds"] = upstream_latency
+    chat_slo = REQUEST_CLASSES["chat"]["slo_seconds"]
+    reset_admission_state()
+    
+    handlers = {
+        "chat": lambda sid: chatbot_interface(sid, "How do Python decorators work?"),
+        "quiz": lambda sid: handle_quiz_request(sid, "Python Lists", "Beginner"),
+        "study_plan": lambda sid: handle_study_plan_request(sid, "Data Science", "4-6"),
+    }
+    results = []
+    results_lock = threading.Lock()
+    
+    session_ids = [new_session_id() for _ in range(num_users)]
+    
+    def run_user(user_index):
+        session_id = session_ids[user_index]
+        save_session(session_id, {"age": "25", "goals": "learn data science", "knowledge_level": "Beginner"})
+        if user_index == 0 and not include_flooder:
+            return
+        rng = random.Random(user_index)
+        for _ in range(requests_per_user):
+            if user_index == 0:
+                request_class = "study_plan"
+            else:
+                request_class = rng.choices(["chat", "quiz", "study_plan"], weights=[5, 3, 2])[0]
+                time.sleep(rng.uniform(0, think_seconds) * time_scale)
+            started = time.monotonic()
+            response = handlers[request_class](session_id)
+            elapsed = time.monotonic() - started
+            if response.startswith(RATE_LIMIT_MESSAGE):
+                outcome = "rate_limited"
+            elif response.startswith(LOAD_SHED_MESSAGE):
+                outcome = "shed"
+            else:
+                outcome = "ok"
+            with results_lock:
+                results.append((user_index, request_class, outcome, elapsed, response))
+    
+    try:
+        threads = [threading.Thread(target=run_user, args=(i,)) for i in range(num_users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        client, UPSTREAM_CONCURRENCY, saved_limits, saved_classes = saved
+        for name, limits in saved_limits.items():
+            BUCKET_LIMITS[name].update(limits)
+        for name, settings in saved_classes.items():
+            REQUEST_CLASSES[name].update(settings)
+        for session_id in session_ids:
+            SESSION_DATA.pop(session_id, None)
+        reset_admission_state()
+    
+    return {
+        "num_users": num_users,
+        "requests_per_user": requests_per_user,
+        "upstream_latency": upstream_latency,
+        "upstream_slots": upstream_slots,
+        "chat_slo_seconds": chat_slo,
+        "results": results,
+    }
+
+def format_load_report(simulation):
+    """Format a per-group, per-class table of simulate_load() outcomes and latencies"""
+    results = simulation["results"]
+    report = "### Simulated Load Report\n\n"
+    report += f"{simulation['num_users']} users x {simulation['requests_per_user']} requests, "
+    report += f"upstream latency {simulation['upstream_latency']}s, {simulation['upstream_slots']} upstream slots, "
+    report += f"chat SLO {simulation['chat_slo_seconds']:.2f}s\n\n"
+    report += "| Group | Class | Sent | OK | Rate limited | Shed | p50 latency (s) | p95 latency (s) |\n"
+    report += "|---|---|---|---|---|---|---|---|\n"
+    for group, members in [("flooding user", lambda u: u == 0), ("other users", lambda u: u != 0)]:
+        for request_class in REQUEST_CLASSES:
+            rows = [r for r in results if members(r[0]) and r[1] == request_class]
+            if not rows:
+                continue
+            latencies = [r[3] for r in rows if r[2] == "ok"]
+            counts = {outcome: sum(1 for r in rows if r[2] == outcome) for outcome in ("ok", "rate_limited", "shed")}
+            report += (
+                f"| {group} | {request_class} | {len(rows)} | {counts['ok']} | {counts['rate_limited']} | "
+                f"{counts['shed']} | {percentile(latencies, 0.5):.2f} | {percentile(latencies, 0.95):.2f} |\n"
+            )
+    return report
+
+def replay_cassette(cassette_path, run_name=None):
+    """Replay a cassette through the current prompt builders against a stub and save a run summary.
+
+    Runs entirely offline. Only the prefill share of each recorded latency (its share of tokens) is
+    scaled by the replayed/recorded prompt-token ratio; decoding depends on completion tokens, which
+    replay does not change. Prefill is cheaper per token than decoding, so this share is an upper
+    bound and the estimated latency change is too. Returns the per-handler summary and writes it to
+    REPLAY_RUNS_DIR so it can be compared against other runs with format_replay_report().
+    """
+    global client, RECORD_CASSETTE
+    exchanges = load_cassette(cassette_path)
+    summary = {
+        name: {"requests": 0, "prompt_tokens": 0, "recorded_prompt_tokens": 0,
+               "completion_tokens": 0, "recorded_latency": 0.0, "estimated_latency": 0.0}
+        for name in PROMPT_BUILDERS
+    }
+    
+    saved = (client, RECORD_CASSETTE)
+    client = make_replay_client(exchanges)
+    RECORD_CASSETTE = None
+    try:
+        for exchange in exchanges:
+            handler = exchange["handler"]
+            messages = PROMPT_BUILDERS[handler](**exchange["inputs"])
+            completion = call_llm(handler, exchange["inputs"], messages)
+            prompt_tokens = completion.usage.prompt_tokens
+            recorded_prompt_tokens = exchange["usage"].get("prompt_tokens") or prompt_tokens
+            recorded_latency = exchange.get("latency", 0.0)
+            stats = summary[handler]
+            stats["requests"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["recorded_prompt_tokens"] += recorded_prompt_tokens
+            stats["completion_tokens"] += completion.usage.completion_tokens
+            stats["recorded_latency"] += recorded_latency
+            completion_tokens = completion.usage.completion_tokens
+            prefill_share = recorded_prompt_tokens / (recorded_prompt_tokens + completion_tokens)
+            prefill_scale = prompt_tokens / recorded_prompt_tokens
+            stats["estimated_latency"] += recorded_latency * (1 - prefill_share + prefill_share * prefill_scale)
+    finally:
+        client, RECORD_CASSETTE = saved
+    
+    run = {
+        "name": run_name or datetime.now().strftime("%Y%m%d-%H%M%S"),
+        "cassette": cassette_path,
+        "system_prompt_chars": len(SYSTEM_PROMPT),
+        "handlers": {name: stats for name, stats in summary.items() if stats["requests"]},
+    }
+    os.makedirs(REPLAY_RUNS_DIR, exist_ok=True)
+    with open(os.path.join(REPLAY_RUNS_DIR, f"{run['name']}.json"), "w", encoding="utf-8") as run_file:
+        json.dump(run, run_file, indent=2)
+    return run
+
+def load_replay_run(run_name):
+    """Load a saved replay run summary by name or path"""
+    path = run_name if run_name.endswith(".json") else os.path.join(REPLAY_RUNS_DIR, f"{run_name}.json")
+    with open(path, encoding="utf-8") as run_file:
+        return json.load(run_file)
+
+def format_replay_report(baseline, candidate=None):
+    """Format a per-handler report for one replay run, or compare a candidate against a baseline"""
+    def averages(stats):
+        requests = stats["requests"]
+        return {
+            "requests": requests,
+            "prompt_tokens": stats["prompt_tokens"] / requests,
+            "completion_tokens": stats["completion_tokens"] / requests,
+            "recorded_latency": stats["recorded_latency"] / requests,
+            "estimated_latency": stats["estimated_latency"] / requests,
+        }
+
+    def change(before, after):
+        return f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+
+    if candidate is None:
+        result = f"### Replay Report: {baseline['name']}\n\n"
+        result += "| Handler | Requests | Avg prompt tokens | Avg completion tokens | Avg recorded latency (s) | Avg est. latency, upper bound (s) |\n"
+        result += "|---|---|---|---|---|---|\n"
+        for handler, stats in baseline["handlers"].items():
+            run = averages(stats)
+            result += (
+                f"| {handler} | {run['requests']} | {run['prompt_tokens']:.1f} | {run['completion_tokens']:.1f} | "
+                f"{run['recorded_latency']:.2f} | {run['estimated_latency']:.2f} |\n"
+            )
+        return result
+    
+    result = f"### Replay Comparison: {baseline['name']} → {candidate['name']}\n\n"
+    result += "| Handler | Requests | Avg prompt tokens | Prompt token change | Avg est. latency, upper bound (s) | Latency change, upper bound |\n"
+    result += "|---|---|---|---|---|---|\n"
+    for handler in sorted(set(baseline["handlers"]) | set(candidate["handlers"])):
+        if handler not in baseline["handlers"] or handler not in candidate["handlers"]:
+            result += f"| {handler} | missing from one run | | | | |\n"
+            continue
+        before = averages(baseline["handlers"][handler])
+        after = averages(candidate["handlers"][handler])
+        result += (
+            f"| {handler} | {after['requests']} | {before['prompt_tokens']:.1f} → {after['prompt_tokens']:.1f} | "
+            f"{change(before['prompt_tokens'], after['prompt_tokens'])} | "
+            f"{before['estimated_latency']:.2f} → {after['estimated_latency']:.2f} | "
+            f"{change(before['estimated_latency'], after['estimated_latency'])} |\n"
+        )
+    return result
+
+def new_session_id():
+    """Generate a random session ID for a visitor"""
+    return str(uuid.uuid4())
+
 def create_chatbot():
     """Create the Gradio interface for the chatbot"""
-    # Generate a random session ID for the user
-    session_id = str(uuid.uuid4())
     
     # Define theme colors and styling
     primary_color = "#4a6fa5"
@@ -557,6 +1580,10 @@ def create_chatbot():
     """
     
     with gr.Blocks(css=custom_css, theme=gr.themes.Soft(primary_hue="blue")) as demo:
+        # Each visitor gets their own session ID when the page loads
+        session_state = gr.State()
+        demo.load(new_session_id, inputs=[], outputs=session_state)
+        
         gr.HTML("<div id='title'>🎓 AI Teaching Assistant</div>")
         gr.HTML("<div id='subtitle'>Your personalized learning companion for Python, Data Science & AI</div>")
         
@@ -677,11 +1704,16 @@ def create_chatbot():
             AI Teaching Assistant | Version 2.0 | © 2025 | Powered by Groq AI
         </div>""")
         
+        # Hidden components backing diagnostic API endpoints
+        prefetch_stats_btn = gr.Button(visible=False)
+        memory_stats_btn = gr.Button(visible=False)
+        diagnostics_output = gr.Markdown(visible=False)
+        
         # Event handlers
-        profile_submit_btn.click(
+        onboarding_event = profile_submit_btn.click(
             user_onboarding,
             inputs=[
-                gr.State(session_id), 
+                session_state, 
                 age_input, 
                 goals_input, 
                 knowledge_level_input,
@@ -692,9 +1724,30 @@ def create_chatbot():
             outputs=profile_output
         )
         
+        if PREFETCH_ENABLED:
+            onboarding_event.then(
+                suggest_next_inputs,
+                inputs=[session_state],
+                outputs=[quiz_topic_input, quiz_difficulty_input, plan_topic_input, plan_time_input]
+            )
+        
+        prefetch_stats_btn.click(
+            format_prefetch_report,
+            inputs=[],
+            outputs=diagnostics_output,
+            api_name="prefetch_stats"
+        )
+        
+        memory_stats_btn.click(
+            format_memory_report,
+            inputs=[],
+            outputs=diagnostics_output,
+            api_name="memory_stats"
+        )
+        
         chat_submit_btn.click(
             chatbot_interface,
-            inputs=[gr.State(session_id), chat_input],
+            inputs=[session_state, chat_input],
             outputs=chat_output
         )
         
@@ -706,19 +1759,19 @@ def create_chatbot():
         
         refresh_recommendations_btn.click(
             generate_recommendations,
-            inputs=[gr.State(session_id)],
+            inputs=[session_state],
             outputs=recommendations_output
         )
         
         generate_quiz_btn.click(
             handle_quiz_request,
-            inputs=[gr.State(session_id), quiz_topic_input, quiz_difficulty_input],
+            inputs=[session_state, quiz_topic_input, quiz_difficulty_input],
             outputs=quiz_output
         )
         
         generate_plan_btn.click(
             handle_study_plan_request,
-            inputs=[gr.State(session_id), plan_topic_input, plan_time_input],
+            inputs=[session_state, plan_topic_input, plan_time_input],
             outputs=plan_output
         )
     
@@ -726,5 +1779,23 @@ def create_chatbot():
 
 # Run the chatbot
 if __name__ == "__main__":
-    app = create_chatbot()
-    app.launch()
+    parser = argparse.ArgumentParser(description="AI Teaching Assistant")
+    parser.add_argument("--simulate-load", action="store_true", help="run a simulated multi-user load against a local stub and exit")
+    parser.add_argument("--replay", metavar="CASSETTE", help="replay a recorded cassette offline and save a run summary")
+    parser.add_argument("--run-name", help="name for the replay run summary (defaults to a timestamp)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="compare two saved replay runs")
+    parser.add_argument("--benchmark-sessions", type=int, nargs="?", const=100000, metavar="N", help="measure session memory for N synthetic sessions (default 100000)")
+    args = parser.parse_args()
+    
+    if args.simulate_load:
+        print(format_load_report(simulate_load()))
+    elif args.replay:
+        print(format_replay_report(replay_cassette(args.replay, args.run_name)))
+    elif args.compare:
+        print(format_replay_report(load_replay_run(args.compare[0]), load_replay_run(args.compare[1])))
+    elif args.benchmark_sessions:
+        print(benchmark_session_memory(args.benchmark_sessions))
+    else:
+        app = create_chatbot()
+        app.queue(default_concurrency_limit=GRADIO_CONCURRENCY_LIMIT)
+        app.launch()
@@ -0,0 +1,65 @@
+"""Load-simulation checks for the admission control layer, run against the local stub client"""
+import os
+import re
+import sys
+
+import pytest
+
+os.environ.setdefault("TEACHING_ASSISTANT_STUB", "1")
+pytest.importorskip("gradio")
+pytest.importorskip("groq")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+
+RETRY_HINT = re.compile(r"Please try again in about \d+ seconds\.$")
+
+
+def success_rate(rows):
+    return sum(1 for row in rows if row[2] == "ok") / len(rows) if rows else 1.0
+
+
+def other_users(simulation, request_class=None):
+    return [
+        row for row in simulation["results"]
+        if row[0] != 0 and (request_class is None or row[1] == request_class)
+    ]
+
+
+@pytest.fixture(scope="module")
+def with_flooder():
+    return app.simulate_load()
+
+
+@pytest.fixture(scope="module")
+def without_flooder():
+    return app.simulate_load(include_flooder=False)
+
+
+def test_queue_is_the_limiting_constraint(with_flooder):
+    outcomes = [row[2] for row in other_users(with_flooder)]
+    assert outcomes.count("shed") > outcomes.count("rate_limited")
+
+
+def test_chat_p95_within_slo(with_flooder):
+    latencies = [row[3] for row in other_users(with_flooder, "chat") if row[2] == "ok"]
+    assert latencies
+    budget = with_flooder["chat_slo_seconds"] + with_flooder["upstream_latency"]
+    assert app.percentile(latencies, 0.95) <= budget
+
+
+def test_chat_is_shed_last(with_flooder):
+    chat_rate = success_rate(other_users(with_flooder, "chat"))
+    for request_class in ("quiz", "study_plan"):
+        assert chat_rate >= success_rate(other_users(with_flooder, request_class))
+
+
+def test_flooder_does_not_lower_other_users_success(with_flooder, without_flooder):
+    assert success_rate(other_users(with_flooder)) >= success_rate(other_users(without_flooder)) - 0.05
+
+
+def test_rejections_carry_retry_hint(with_flooder):
+    rejected = [row for row in with_flooder["results"] if row[2] in ("shed", "rate_limited")]
+    assert rejected
+    for row in rejected:
+        assert RETRY_HINT.search(row[4])